@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
 from pathlib import Path
 
 # SQLite database file
@@ -8,9 +9,24 @@ sqlite_url = f"sqlite:///{Path(__file__).parent.parent.parent}/{sqlite_file_name
 connect_args = {"check_same_thread": False}
 engine = create_engine(sqlite_url, connect_args=connect_args)
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL journaling lets readers run alongside a writer, and with synchronous=NORMAL
+    # a commit no longer waits on an fsync of the main database file
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 def get_session():
     with Session(engine) as session:
         yield session
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    
+    # create_all skips tables that already exist, including their indexes,
+    # so add any indexes introduced since the database file was created
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
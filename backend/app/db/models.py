@@ -1,5 +1,6 @@
 from typing import Optional, List
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Index, text
 from datetime import date, datetime
 
 # --- CORE ENTITIES ---
@@ -80,6 +81,19 @@ class Transfer(SQLModel, table=True):
     Medicine transfer between districts with cryptographic chain of custody.
     Requires 3-party verification: Sender → Transporter → Receiver
     """
+    __table_args__ = (
+        # Serves status filters ordered by creation time (list and pending views);
+        # its status prefix also covers plain status lookups
+        Index("ix_transfer_status_created", "status", "created_at"),
+        # Partial index: only the (few) discrepant transfers are indexed
+        Index(
+            "ix_transfer_discrepancy",
+            "has_discrepancy",
+            sqlite_where=text("has_discrepancy = 1"),
+            postgresql_where=text("has_discrepancy = true")
+        ),
+    )
+    
     id: str = Field(primary_key=True)  # UUID
     
     # What is being transferred
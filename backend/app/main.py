@@ -3,10 +3,15 @@ MedPredict AI - FastAPI Backend
 Main application entry point
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import json
+import logging
+import re
 from pathlib import Path
 
 from app.routers import forecast, alerts, recommendations, stock, transfers
@@ -14,10 +19,43 @@ from app.db.database import create_db_and_tables
 from app.data.synthetic import generate_all_data
 from app.models.forecaster import DemandForecaster
 
+logger = logging.getLogger(__name__)
+
 # Global state
 forecaster = None
 config = None
 
+# State-level endpoints polled by the dashboard; these get ETag conditional GETs
+ETAG_PATHS = {
+    "/api/alerts/",
+    "/api/stock/state",
+    "/api/forecast/state",
+    "/api/recommendations/network",
+}
+# Per-request timestamps are excluded from the (weak) ETag so unchanged data still matches
+VOLATILE_FIELDS = re.compile(rb'"(?:generated_at|triggered_at)":\s*"[^"]*"')
+
+# Current weather for every district is fetched once at startup, a bounded
+# number at a time, so the first dashboard load reads from the cache
+WEATHER_WARMUP_CONCURRENCY = 16
+
+
+async def warm_weather_cache(districts: list):
+    """Fetch current weather for all districts concurrently to fill the cache"""
+    from app.services.weather_service import weather_service
+    
+    semaphore = asyncio.Semaphore(WEATHER_WARMUP_CONCURRENCY)
+    
+    async def warm(district: dict):
+        async with semaphore:
+            await weather_service.get_current_weather(district['lat'], district['lng'], district['id'])
+    
+    results = await asyncio.gather(*(warm(d) for d in districts), return_exceptions=True)
+    for district, result in zip(districts, results):
+        if isinstance(result, Exception):
+            logger.warning("Weather warmup failed for %s: %r", district['id'], result)
+    print(f"Weather cache warmed for {len(districts)} districts")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,24 +78,59 @@ async def lifespan(app: FastAPI):
     
     # Initialize forecaster
     forecaster = DemandForecaster(config, data_dir)
+    
+    # Warm the weather cache in the background; requests arriving meanwhile
+    # share the in-flight fetches instead of issuing their own
+    weather_warmup = asyncio.create_task(warm_weather_cache(config['districts']))
     print("MedPredict AI Backend Ready!")
     
     yield
     
     # Cleanup
     print("Shutting down...")
+    weather_warmup.cancel()
+    await asyncio.gather(weather_warmup, return_exceptions=True)
     from app.services.weather_service import weather_service
-    await weather_service.close()
+    await weather_service.close()  # Also cancels fetches the warmup left in flight
 
 
 app = FastAPI(
     title="MedPredict AI",
     description="AI-Based Medicine Demand Forecasting for Public Health Emergencies",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS for frontend
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """Tag state-level responses with a weak ETag and answer 304 on a match"""
+    response = await call_next(request)
+    if (
+        request.method != "GET"
+        or request.url.path not in ETAG_PATHS
+        or response.status_code != 200
+    ):
+        return response
+    
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    digest = hashlib.blake2b(VOLATILE_FIELDS.sub(b"", body), digest_size=8).hexdigest()
+    etag = f'W/"{digest}"'
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=response.headers
+    )
+
+
+# CORS for frontend (added last so it wraps the ETag middleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
@@ -66,6 +139,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
 # Include routers
 app.include_router(forecast.router, prefix="/api/forecast", tags=["forecast"])
 app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
@@ -10,9 +10,12 @@ Key Upgrades:
 
 import pandas as pd
 import numpy as np
+import asyncio
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
 import json
 
 from sklearn.ensemble import IsolationForest, GradientBoostingRegressor
@@ -26,6 +29,22 @@ logging.getLogger('prophet').setLevel(logging.ERROR)
 logging.getLogger('cmdstanpy').setLevel(logging.ERROR)
 
 
+@dataclass
+class StockMatrix:
+    """
+    District × medicine stock snapshot in struct-of-arrays layout.
+    Row i is district_ids[i], column j is medicine_ids[j].
+    """
+    district_ids: List[str]
+    medicine_ids: List[str]
+    current: np.ndarray
+    demand: np.ndarray  # Predicted 14-day demand
+    gap: np.ndarray  # Stock minus order point (negative = deficit)
+    days_until_stockout: np.ndarray
+    percentage: np.ndarray
+    status: np.ndarray  # Int-coded, see CausalDemandForecaster.STOCK_*
+
+
 class CausalDemandForecaster:
     """
     FIRST PRINCIPLES FORECASTER
@@ -45,12 +64,31 @@ class CausalDemandForecaster:
     # Service level for safety stock (97.5% = 1.96 z-score)
     SERVICE_LEVEL_Z = 1.96
     
+    # Int codes for StockMatrix.status (index into STOCK_STATUSES)
+    STOCK_STATUSES = ('critical', 'warning', 'good')
+    STOCK_CRITICAL = 0
+    STOCK_WARNING = 1
+    STOCK_GOOD = 2
+    STOCK_MISSING = -1  # No stock row for this district/medicine
+    
+    # The stock matrix runs a demand forecast per stock row, so it is computed
+    # once and reused by every stock/recommendation request for this long
+    STOCK_MATRIX_TTL = 900  # seconds
+    
     def __init__(self, config: dict, data_dir: Path):
         self.config = config
         self.data_dir = data_dir
         self.districts = {d['id']: d for d in config['districts']}
         self.medicines = {m['id']: m for m in config['medicines']}
         
+        # Row/column order of the stock matrix
+        self.district_ids = list(self.districts.keys())
+        self.medicine_ids = list(self.medicines.keys())
+        self._medicine_index = {m: j for j, m in enumerate(self.medicine_ids)}
+        self._stock_matrix = None
+        self._stock_matrix_at = 0.0  # time.monotonic() of the last build
+        self._stock_matrix_lock = asyncio.Lock()
+        
         # Load data
         # Load data from DATABASE (Production Grade)
         from app.db.database import engine
@@ -375,7 +413,7 @@ class CausalDemandForecaster:
         # =========================================================================
         from app.services.weather_service import weather_service
         
-        forecast_weather = []
+        forecast_df = None
         if 'lat' in district and 'lng' in district:
             try:
                 # Get 14-day weather forecast
@@ -386,10 +424,12 @@ class CausalDemandForecaster:
                     days=14
                 )
                 
-                for fc in forecast_data:
-                    # Convert to same format as historical weather
-                    forecast_weather.append({
-                        'date': pd.to_datetime(fc['date']).tz_localize(None),
+                if forecast_data:
+                    # Convert to same format as historical weather, column by column
+                    # (one vectorized date parse instead of a conversion per day)
+                    fc = pd.DataFrame.from_records(forecast_data)
+                    forecast_df = pd.DataFrame({
+                        'date': pd.to_datetime(fc['date']).dt.tz_localize(None),
                         'district_id': district_id,
                         'rainfall': fc['rainfall_prediction'],
                         'temperature': fc['temperature'],
@@ -404,8 +444,7 @@ class CausalDemandForecaster:
         # =========================================================================
         # STEP C: Splice Timeline (History + Forecast)
         # =========================================================================
-        if forecast_weather:
-            forecast_df = pd.DataFrame(forecast_weather)
+        if forecast_df is not None:
             # Ensure date columns are compatible (strip timezone)
             historical_weather['date'] = pd.to_datetime(historical_weather['date']).dt.tz_localize(None)
             forecast_df['date'] = pd.to_datetime(forecast_df['date']).dt.tz_localize(None)
@@ -654,18 +693,9 @@ class CausalDemandForecaster:
             # Order point = Predicted demand + Safety stock
             order_point = total_14d_demand + safety_stock
             
-            # Gap includes safety stock buffer
-            gap = current_stock - order_point
-            
-            days_until_stockout = int(current_stock / max(total_14d_demand / 14, 1))
-            stock_percentage = min(100, int(current_stock / max(order_point, 1) * 100))
-            
-            if stock_percentage < 30:
-                status = 'critical'
-            elif stock_percentage < 60:
-                status = 'warning'
-            else:
-                status = 'good'
+            gap, days_until_stockout, stock_percentage, status = self._stock_levels(
+                current_stock, total_14d_demand, order_point
+            )
             
             # Compute days until expiry from expiry_date
             expiry_date = row['expiry_date']
@@ -692,6 +722,80 @@ class CausalDemandForecaster:
         
         return results
     
+    async def stock_matrix(self) -> StockMatrix:
+        """
+        Stock status for every district and medicine as dense (D, M) arrays,
+        so state-wide summaries are NumPy reductions instead of nested loops.
+        Cached for STOCK_MATRIX_TTL; the arrays are read-only as they are shared.
+        """
+        async with self._stock_matrix_lock:
+            if self._stock_matrix is None or time.monotonic() - self._stock_matrix_at >= self.STOCK_MATRIX_TTL:
+                self._stock_matrix = await self._build_stock_matrix()
+                self._stock_matrix_at = time.monotonic()
+            return self._stock_matrix
+    
+    @staticmethod
+    def _stock_levels(current_stock, total_14d_demand, order_point) -> Tuple[float, int, int, str]:
+        """Gap, days until stockout, stock percentage and status for a stock level"""
+        # Gap includes safety stock buffer
+        gap = current_stock - order_point
+        
+        days_until_stockout = int(current_stock / max(total_14d_demand / 14, 1))
+        stock_percentage = min(100, int(current_stock / max(order_point, 1) * 100))
+        
+        if stock_percentage < 30:
+            status = 'critical'
+        elif stock_percentage < 60:
+            status = 'warning'
+        else:
+            status = 'good'
+        
+        return gap, days_until_stockout, stock_percentage, status
+    
+    async def _build_stock_matrix(self) -> StockMatrix:
+        """Compute the stock status of every district/medicine cell into a StockMatrix"""
+        shape = (len(self.district_ids), len(self.medicine_ids))
+        current = np.zeros(shape, dtype=np.float64)
+        demand = np.zeros(shape, dtype=np.float64)
+        gap = np.zeros(shape, dtype=np.float64)
+        days_until_stockout = np.zeros(shape, dtype=np.int32)
+        percentage = np.zeros(shape, dtype=np.int32)
+        status = np.full(shape, self.STOCK_MISSING, dtype=np.int8)
+        status_codes = {name: code for code, name in enumerate(self.STOCK_STATUSES)}
+        
+        district_index = {d: i for i, d in enumerate(self.district_ids)}
+        
+        # Stock rows are per batch, while demand and safety stock are per district
+        # and medicine, so batches are summed into one stock level per cell
+        cell_stock = self.stock_df.groupby(['district_id', 'medicine_id'], sort=False)['quantity'].sum()
+        
+        for (district_id, medicine_id), current_stock in cell_stock.items():
+            i = district_index.get(district_id)
+            j = self._medicine_index.get(medicine_id)
+            if i is None or j is None:
+                continue
+            
+            demand_forecast = await self.forecast_medicine_demand(district_id, medicine_id, 14)
+            total_14d_demand = sum(f['predicted_demand'] for f in demand_forecast)
+            safety_stock = await self.calculate_safety_stock(district_id, medicine_id)
+            order_point = total_14d_demand + safety_stock
+            
+            cell_gap, cell_days, cell_percentage, cell_status = self._stock_levels(
+                current_stock, total_14d_demand, order_point
+            )
+            current[i, j] = current_stock
+            demand[i, j] = int(total_14d_demand)
+            gap[i, j] = int(cell_gap)
+            days_until_stockout[i, j] = cell_days
+            percentage[i, j] = cell_percentage
+            status[i, j] = status_codes[cell_status]
+        
+        arrays = (current, demand, gap, days_until_stockout, percentage, status)
+        for array in arrays:
+            array.flags.writeable = False
+        
+        return StockMatrix(self.district_ids, self.medicine_ids, *arrays)
+    
     async def optimize_network_transfers(self) -> List[Dict]:
         """
         NETWORK OPTIMIZATION: Consider transfers before orders
@@ -704,33 +808,30 @@ class CausalDemandForecaster:
         transfers = []
         orders = []
         
-        for med_id in self.medicines.keys():
-            surpluses = []
-            deficits = []
+        # One stock pass for the whole network, then slice per medicine
+        matrix = await self.stock_matrix()
+        
+        for j, med_id in enumerate(matrix.medicine_ids):
+            gaps = matrix.gap[:, j]
             
-            for district_id in self.districts.keys():
-                stock_status = await self.get_stock_status(district_id)
-                med_status = next((s for s in stock_status if s['medicine_id'] == med_id), None)
-                
-                if not med_status:
-                    continue
-                
-                gap = med_status['stock_gap']
-                
-                if gap > 0:
-                    # Surplus: can transfer out
-                    surpluses.append({
-                        'district_id': district_id,
-                        'district_name': self.districts[district_id]['name'],
-                        'surplus': gap
-                    })
-                elif gap < 0:
-                    # Deficit: needs stock
-                    deficits.append({
-                        'district_id': district_id,
-                        'district_name': self.districts[district_id]['name'],
-                        'deficit': abs(gap)
-                    })
+            # Surplus: can transfer out
+            surpluses = [
+                {
+                    'district_id': matrix.district_ids[i],
+                    'district_name': self.districts[matrix.district_ids[i]]['name'],
+                    'surplus': int(gaps[i])
+                }
+                for i in np.flatnonzero(gaps > 0)
+            ]
+            # Deficit: needs stock
+            deficits = [
+                {
+                    'district_id': matrix.district_ids[i],
+                    'district_name': self.districts[matrix.district_ids[i]]['name'],
+                    'deficit': int(-gaps[i])
+                }
+                for i in np.flatnonzero(gaps < 0)
+            ]
             
             # Sort by amount
             surpluses.sort(key=lambda x: -x['surplus'])
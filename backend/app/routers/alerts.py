@@ -2,50 +2,93 @@
 Alerts API Router
 """
 
-from fastapi import APIRouter, Query
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional, Tuple
 from datetime import datetime
+from collections import OrderedDict
+import time
 
 router = APIRouter()
 
+# Risk levels that raise an alert, and their sort order (most severe first)
+_ALERT_LEVELS = frozenset(('red', 'orange', 'yellow'))
+_SEVERITY_ORDER = {'red': 0, 'orange': 1, 'yellow': 2, 'green': 3}
+
+# Timeline responses are memoized per (district_id, days), LRU-bounded since
+# district_id comes straight from the URL
+TIMELINE_CACHE_TTL = 60  # seconds
+TIMELINE_CACHE_SIZE = 256
+_timeline_cache = OrderedDict()
+
+# Shared (immutable) action lists, so alerts don't allocate a new list per district
+_RECOMMENDED_ACTIONS = {
+    'red': (
+        "Verify stock levels for key medicines",
+        "Alert district hospital for surge preparation",
+        "Consider requesting emergency stock transfer",
+        "Increase surveillance reporting frequency"
+    ),
+    'orange': (
+        "Review stock levels for key medicines",
+        "Prepare redistribution plan",
+        "Monitor situation closely"
+    ),
+    'default': (
+        "Continue routine monitoring",
+        "Ensure stock levels are maintained"
+    )
+}
+
 
 def get_forecaster():
+    """Get forecaster from app state"""
     from app.main import forecaster
+    if forecaster is None:
+        raise HTTPException(status_code=503, detail="Forecaster not initialized")
     return forecaster
 
 
 @router.get("/")
-async def get_all_alerts(level: Optional[str] = Query(None)):
+async def get_all_alerts(
+    level: Optional[str] = Query(None),
+    verbose: bool = Query(False, description="Include message, signals, anomalies and actions")
+):
     """Get all active alerts across districts"""
     forecaster = get_forecaster()
     
     alerts = []
     for district_id, district in forecaster.districts.items():
         risk = await forecaster.calculate_risk_score(district_id)
-        anomalies = forecaster.detect_anomalies(district_id)
         
+        # Filter before anomaly detection so skipped districts cost nothing extra
         if level and risk['level'] != level:
             continue
+        if risk['level'] not in _ALERT_LEVELS:
+            continue
+        
+        alert = {
+            'id': f"alert-{district_id}-{datetime.now().strftime('%Y%m%d')}",
+            'district_id': district_id,
+            'district_name': district['name'],
+            'level': risk['level'],
+            'risk_score': risk['score'],
+            'title': _get_alert_title(risk['level'], district['name'])
+        }
         
-        if risk['level'] in ['red', 'orange', 'yellow']:
-            alert = {
-                'id': f"alert-{district_id}-{datetime.now().strftime('%Y%m%d')}",
-                'district_id': district_id,
-                'district_name': district['name'],
-                'level': risk['level'],
-                'risk_score': risk['score'],
-                'title': _get_alert_title(risk['level'], district['name']),
+        # Heavy fields (and anomaly detection) only when asked for
+        if verbose:
+            anomalies = forecaster.detect_anomalies(district_id)
+            alert.update({
                 'message': _get_alert_message(risk, anomalies),
                 'signals': risk['signals'],
                 'anomalies': anomalies,
                 'triggered_at': datetime.now().isoformat(),
                 'recommended_actions': _get_recommended_actions(risk['level'])
-            }
-            alerts.append(alert)
+            })
+        alerts.append(alert)
     
     # Sort by severity
-    severity_order = {'red': 0, 'orange': 1, 'yellow': 2, 'green': 3}
-    alerts.sort(key=lambda x: severity_order[x['level']])
+    alerts.sort(key=lambda x: _SEVERITY_ORDER[x['level']])
     
     return {
         'count': len(alerts),
@@ -99,42 +142,57 @@ async def get_alert_timeline(district_id: str, days: int = Query(7, ge=1, le=30)
     """Get historical alert timeline for a district (simulated)"""
     forecaster = get_forecaster()
     
+    # Small, slow-moving payload: memoize briefly
+    cache_key = (district_id, days)
+    now = time.monotonic()
+    entry = _timeline_cache.get(cache_key)
+    if entry is not None and now - entry['timestamp'] < TIMELINE_CACHE_TTL:
+        _timeline_cache.move_to_end(cache_key)
+        return entry['data']
+    
     # Generate simulated timeline
     timeline = []
-    base_date = datetime.now()
+    date_str = datetime.now().strftime('%Y-%m-%d')
     
     risk = await forecaster.calculate_risk_score(district_id)
+    signals = risk['signals']
+    risk_level = risk['level']
     
     # Create timeline entries based on current signals
-    weather_signal = risk['signals'].get('causal_weather', risk['signals'].get('weather', 0))
+    weather_signal = signals.get('causal_weather', signals.get('weather', 0))
     if weather_signal > 0.6:
         timeline.append({
-            'date': base_date.strftime('%Y-%m-%d'),
+            'date': date_str,
             'event': 'weather_signal',
             'level': 'orange' if weather_signal > 0.7 else 'yellow',
             'message': f"Weather conditions from 14 days ago indicate elevated risk"
         })
     
-    if risk['signals']['trend'] > 0.6:
+    if signals['trend'] > 0.6:
         timeline.append({
-            'date': base_date.strftime('%Y-%m-%d'),
+            'date': date_str,
             'event': 'trend_signal',
             'level': 'yellow',
             'message': 'Case trend showing uptick'
         })
     
-    if risk['level'] in ['red', 'orange']:
+    if risk_level in ('red', 'orange'):
         timeline.append({
-            'date': base_date.strftime('%Y-%m-%d'),
+            'date': date_str,
             'event': 'combined_alert',
-            'level': risk['level'],
-            'message': f"Combined risk crossed {0.75 if risk['level'] == 'red' else 0.5} threshold"
+            'level': risk_level,
+            'message': f"Combined risk crossed {0.75 if risk_level == 'red' else 0.5} threshold"
         })
     
-    return {
+    result = {
         'district_id': district_id,
         'timeline': timeline
     }
+    _timeline_cache[cache_key] = {'timestamp': now, 'data': result}
+    _timeline_cache.move_to_end(cache_key)
+    if len(_timeline_cache) > TIMELINE_CACHE_SIZE:
+        _timeline_cache.popitem(last=False)
+    return result
 
 
 def _get_alert_title(level: str, district_name: str) -> str:
@@ -162,25 +220,8 @@ def _get_alert_message(risk: dict, anomalies: list) -> str:
     return ". ".join(parts) if parts else "Elevated risk detected based on multiple signals"
 
 
-def _get_recommended_actions(level: str) -> List[str]:
-    if level == 'red':
-        return [
-            "Verify stock levels for key medicines",
-            "Alert district hospital for surge preparation",
-            "Consider requesting emergency stock transfer",
-            "Increase surveillance reporting frequency"
-        ]
-    elif level == 'orange':
-        return [
-            "Review stock levels for key medicines",
-            "Prepare redistribution plan",
-            "Monitor situation closely"
-        ]
-    else:
-        return [
-            "Continue routine monitoring",
-            "Ensure stock levels are maintained"
-        ]
+def _get_recommended_actions(level: str) -> Tuple[str, ...]:
+    return _RECOMMENDED_ACTIONS.get(level, _RECOMMENDED_ACTIONS['default'])
 
 
 def _describe_weather_signal(weather: dict) -> str:
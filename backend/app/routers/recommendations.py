@@ -6,6 +6,7 @@ With Network Optimization and Causal Context
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from datetime import datetime
+import numpy as np
 
 router = APIRouter()
 
@@ -35,7 +36,10 @@ async def get_network_optimization():
 
 
 def get_forecaster():
+    """Get forecaster from app state"""
     from app.main import forecaster
+    if forecaster is None:
+        raise HTTPException(status_code=503, detail="Forecaster not initialized")
     return forecaster
 
 
@@ -69,29 +73,22 @@ async def simulate_scenario(
     """
     forecaster = get_forecaster()
     
-    # Calculate baseline metrics
-    total_stockouts_without = 0
-    total_stockouts_with = 0
+    matrix = await forecaster.stock_matrix()
+    has_stock = matrix.status != forecaster.STOCK_MISSING
     
-    for district_id in forecaster.districts.keys():
-        stock_status = await forecaster.get_stock_status(district_id)
-        
-        for stock in stock_status:
-            # Simulated demand with severity multiplier
-            adjusted_demand = stock['predicted_14d_demand'] * severity_multiplier
-            
-            # Without system: 14 day response
-            days_to_respond_without = 14
-            demand_before_response = adjusted_demand * (days_to_respond_without / 14)
-            if stock['current_stock'] < demand_before_response:
-                total_stockouts_without += 1
-            
-            # With system: early response
-            demand_before_response_with = adjusted_demand * (response_days / 14)
-            # Plus can pre-position stock
-            effective_stock = stock['current_stock'] * 1.3  # Buffer from early warning
-            if effective_stock < demand_before_response_with:
-                total_stockouts_with += 1
+    # Simulated demand with severity multiplier
+    adjusted_demand = matrix.demand * severity_multiplier
+    
+    # Without system: 14 day response
+    days_to_respond_without = 14
+    demand_before_response = adjusted_demand * (days_to_respond_without / 14)
+    total_stockouts_without = int((has_stock & (matrix.current < demand_before_response)).sum())
+    
+    # With system: early response
+    demand_before_response_with = adjusted_demand * (response_days / 14)
+    # Plus can pre-position stock
+    effective_stock = matrix.current * 1.3  # Buffer from early warning
+    total_stockouts_with = int((has_stock & (effective_stock < demand_before_response_with)).sum())
     
     stockouts_prevented = total_stockouts_without - total_stockouts_with
     
@@ -136,43 +133,25 @@ async def get_suggested_transfers():
     forecaster = get_forecaster()
     
     transfers = []
-    
-    # Find surplus and deficit districts
-    district_status = {}
-    for district_id in forecaster.districts.keys():
-        stock_status = await forecaster.get_stock_status(district_id)
-        risk = await forecaster.calculate_risk_score(district_id)
-        
-        district_status[district_id] = {
-            'name': forecaster.districts[district_id]['name'],
-            'risk_level': risk['level'],
-            'stocks': {s['medicine_id']: s for s in stock_status}
-        }
+    matrix = await forecaster.stock_matrix()
     
     # Match deficits with surpluses
-    for med_id in forecaster.medicines.keys():
-        deficits = []
-        surpluses = []
-        
-        for dist_id, status in district_status.items():
-            stock = status['stocks'].get(med_id, {})
-            if stock.get('status') == 'critical':
-                deficits.append((dist_id, status['name'], stock.get('stock_gap', 0)))
-            elif stock.get('stock_percentage', 0) > 100:
-                surplus = stock.get('current_stock', 0) - stock.get('predicted_14d_demand', 0)
-                if surplus > 0:
-                    surpluses.append((dist_id, status['name'], surplus))
+    for j, med_id in enumerate(matrix.medicine_ids):
+        surplus_amounts = matrix.current[:, j] - matrix.demand[:, j]
+        deficits = np.flatnonzero(matrix.status[:, j] == forecaster.STOCK_CRITICAL)
+        surpluses = np.flatnonzero((matrix.percentage[:, j] > 100) & (surplus_amounts > 0))
         
         # Create transfer recommendations
-        for deficit in deficits:
-            for surplus in surpluses:
-                if abs(deficit[2]) <= surplus[2]:
+        for d in deficits:
+            deficit = abs(matrix.gap[d, j])
+            for s in surpluses:
+                if deficit <= surplus_amounts[s]:
                     transfers.append({
                         'medicine_id': med_id,
                         'medicine_name': forecaster.medicines[med_id]['name'],
-                        'from_district': surplus[1],
-                        'to_district': deficit[1],
-                        'quantity': int(min(abs(deficit[2]), surplus[2])),
+                        'from_district': forecaster.districts[matrix.district_ids[s]]['name'],
+                        'to_district': forecaster.districts[matrix.district_ids[d]]['name'],
+                        'quantity': int(min(deficit, surplus_amounts[s])),
                         'priority': 'urgent'
                     })
                     break
@@ -4,12 +4,16 @@ Stock API Router
 
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
+import numpy as np
 
 router = APIRouter()
 
 
 def get_forecaster():
+    """Get forecaster from app state"""
     from app.main import forecaster
+    if forecaster is None:
+        raise HTTPException(status_code=503, detail="Forecaster not initialized")
     return forecaster
 
 
@@ -18,21 +22,21 @@ async def get_state_stock_overview():
     """Get stock overview for entire state"""
     forecaster = get_forecaster()
     
-    results = {}
-    total_critical = 0
-    total_warning = 0
-    total_good = 0
+    matrix = await forecaster.stock_matrix()
     
-    for district_id in forecaster.districts.keys():
-        stock_status = await forecaster.get_stock_status(district_id)
-        
-        critical_count = len([s for s in stock_status if s['status'] == 'critical'])
-        warning_count = len([s for s in stock_status if s['status'] == 'warning'])
-        good_count = len([s for s in stock_status if s['status'] == 'good'])
-        
-        total_critical += critical_count
-        total_warning += warning_count
-        total_good += good_count
+    critical_counts = (matrix.status == forecaster.STOCK_CRITICAL).sum(axis=1)
+    warning_counts = (matrix.status == forecaster.STOCK_WARNING).sum(axis=1)
+    good_counts = (matrix.status == forecaster.STOCK_GOOD).sum(axis=1)
+    
+    total_critical = int(critical_counts.sum())
+    total_warning = int(warning_counts.sum())
+    total_good = int(good_counts.sum())
+    
+    results = {}
+    for i, district_id in enumerate(matrix.district_ids):
+        critical_count = int(critical_counts[i])
+        warning_count = int(warning_counts[i])
+        good_count = int(good_counts[i])
         
         # Calculate overall district status
         if critical_count > 0:
@@ -98,27 +102,27 @@ async def get_all_stock_gaps():
     """Get all stock gaps across districts"""
     forecaster = get_forecaster()
     
-    gaps = []
+    matrix = await forecaster.stock_matrix()
     
-    for district_id in forecaster.districts.keys():
-        stock_status = await forecaster.get_stock_status(district_id)
-        
-        for stock in stock_status:
-            if stock['stock_gap'] < 0:  # Deficit
-                gaps.append({
-                    'district_id': district_id,
-                    'district_name': forecaster.districts[district_id]['name'],
-                    'medicine_id': stock['medicine_id'],
-                    'medicine_name': stock['medicine_name'],
-                    'gap': abs(stock['stock_gap']),
-                    'current_stock': stock['current_stock'],
-                    'predicted_demand': stock['predicted_14d_demand'],
-                    'days_until_stockout': stock['days_until_stockout'],
-                    'status': stock['status']
-                })
+    # Deficit cells, most urgent (fewest days until stockout) first
+    deficits = np.argwhere(matrix.gap < 0)
+    order = np.argsort(matrix.days_until_stockout[deficits[:, 0], deficits[:, 1]], kind='stable')
     
-    # Sort by severity (days until stockout)
-    gaps.sort(key=lambda x: x['days_until_stockout'])
+    gaps = []
+    for i, j in deficits[order]:
+        district_id = matrix.district_ids[i]
+        medicine_id = matrix.medicine_ids[j]
+        gaps.append({
+            'district_id': district_id,
+            'district_name': forecaster.districts[district_id]['name'],
+            'medicine_id': medicine_id,
+            'medicine_name': forecaster.medicines[medicine_id]['name'],
+            'gap': int(-matrix.gap[i, j]),
+            'current_stock': int(matrix.current[i, j]),
+            'predicted_demand': int(matrix.demand[i, j]),
+            'days_until_stockout': int(matrix.days_until_stockout[i, j]),
+            'status': forecaster.STOCK_STATUSES[matrix.status[i, j]]
+        })
     
     return {
         'total_gaps': len(gaps),
@@ -5,9 +5,12 @@ Endpoints for creating, tracking, and verifying medicine transfers
 
 from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from datetime import datetime
 from sqlmodel import Session, select
+from sqlalchemy import case, exists, func, tuple_, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.orm import selectinload
 
 from app.db.database import get_session
 from app.db.models import Transfer, TransferItem, District, Medicine
@@ -15,6 +18,22 @@ from app.services.verification import verification_service
 
 router = APIRouter()
 
+# Districts and medicines are reference data that is never deleted at runtime,
+# so ids seen once are remembered; only unknown ids go to the database
+_known_district_ids = set()
+_known_medicine_ids = set()
+
+# Transfer attributes exposed by the API, in response order
+TRANSFER_FIELDS = (
+    "id", "medicine_id", "quantity", "from_district_id", "to_district_id",
+    "status", "priority", "created_at", "created_by", "sender_signature",
+    "sender_notes", "pickup_at", "transporter_id", "transporter_signature",
+    "delivered_at", "receiver_id", "receiver_signature", "received_quantity",
+    "receiver_notes", "verification_hash", "is_verified", "has_discrepancy",
+    "discrepancy_type", "discrepancy_notes"
+)
+TRANSFER_COLUMNS = tuple(getattr(Transfer, field) for field in TRANSFER_FIELDS)
+
 
 # --- REQUEST/RESPONSE MODELS ---
 
@@ -52,34 +71,62 @@ class DeliveryRequest(BaseModel):
 
 # --- HELPER FUNCTIONS ---
 
+def _references_exist(
+    session: Session,
+    from_district_id: str,
+    to_district_id: str,
+    medicine_id: str
+) -> Tuple[bool, bool, bool]:
+    """
+    Check that both districts and the medicine exist.
+    Ids missing from the process-local cache are checked together in a single
+    SELECT EXISTS(...), EXISTS(...) round-trip instead of loading full rows.
+    """
+    checks = [
+        (District, _known_district_ids, from_district_id),
+        (District, _known_district_ids, to_district_id),
+        (Medicine, _known_medicine_ids, medicine_id)
+    ]
+    found = [entity_id in known_ids for _, known_ids, entity_id in checks]
+    unknown = [i for i, is_known in enumerate(found) if not is_known]
+    
+    if unknown:
+        row = session.execute(sa_select(*[
+            exists().where(checks[i][0].id == checks[i][2]) for i in unknown
+        ])).one()
+        for i, is_found in zip(unknown, row):
+            if is_found:
+                checks[i][1].add(checks[i][2])
+                found[i] = True
+    
+    return tuple(found)
+
+
+def get_transfer_items(
+    session: Session,
+    transfer_id: str,
+    refresh: bool = False
+) -> List[TransferItem]:
+    """
+    Load a transfer's items once per request.
+    Results are memoized on the request's session, so repeated lookups within a
+    handler reuse them; pass refresh=True after writing to the items.
+    """
+    item_cache = session.info.setdefault("transfer_items", {})
+    if refresh or transfer_id not in item_cache:
+        item_cache[transfer_id] = session.exec(
+            select(TransferItem).where(TransferItem.transfer_id == transfer_id)
+        ).all()
+    return item_cache[transfer_id]
+
+
 def get_transfer_dict(transfer: Transfer, items: List[TransferItem] = None) -> dict:
-    """Convert Transfer model to dict with computed fields"""
-    result = {
-        "id": transfer.id,
-        "medicine_id": transfer.medicine_id,
-        "quantity": transfer.quantity,
-        "from_district_id": transfer.from_district_id,
-        "to_district_id": transfer.to_district_id,
-        "status": transfer.status,
-        "priority": transfer.priority,
-        "created_at": transfer.created_at.isoformat() if transfer.created_at else None,
-        "created_by": transfer.created_by,
-        "sender_signature": transfer.sender_signature,
-        "sender_notes": transfer.sender_notes,
-        "pickup_at": transfer.pickup_at.isoformat() if transfer.pickup_at else None,
-        "transporter_id": transfer.transporter_id,
-        "transporter_signature": transfer.transporter_signature,
-        "delivered_at": transfer.delivered_at.isoformat() if transfer.delivered_at else None,
-        "receiver_id": transfer.receiver_id,
-        "receiver_signature": transfer.receiver_signature,
-        "received_quantity": transfer.received_quantity,
-        "receiver_notes": transfer.receiver_notes,
-        "verification_hash": transfer.verification_hash,
-        "is_verified": transfer.is_verified,
-        "has_discrepancy": transfer.has_discrepancy,
-        "discrepancy_type": transfer.discrepancy_type,
-        "discrepancy_notes": transfer.discrepancy_notes,
-    }
+    """
+    Convert Transfer model to dict with computed fields.
+    Timestamps stay datetimes (the verification service compares them directly);
+    FastAPI encodes them as ISO 8601 in the response.
+    """
+    result = {field: getattr(transfer, field) for field in TRANSFER_FIELDS}
     
     if items:
         result["items"] = [
@@ -99,18 +146,28 @@ def get_transfer_dict(transfer: Transfer, items: List[TransferItem] = None) -> d
 
 
 # --- ENDPOINTS ---
+# Declared with plain `def`: the Session calls block, so FastAPI runs these
+# handlers in its threadpool instead of stalling the event loop.
 
 @router.get("/")
-async def list_transfers(
+def list_transfers(
     status: Optional[str] = None,
     from_district: Optional[str] = None,
     to_district: Optional[str] = None,
     has_discrepancy: Optional[bool] = None,
     limit: int = Query(50, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     session: Session = Depends(get_session)
 ):
-    """List all transfers with optional filters"""
-    query = select(Transfer).order_by(Transfer.created_at.desc())
+    """
+    List all transfers with optional filters, newest first.
+    Pages are keyset-based: pass the returned next_cursor (the created_at and id
+    of the last row) to continue after it, so deep pages stay an index range scan.
+    The id breaks ties between transfers created at the same instant.
+    """
+    # Only the exposed columns are selected and rows come back as mappings,
+    # skipping ORM object construction for what is a read-only listing
+    query = sa_select(*TRANSFER_COLUMNS).order_by(Transfer.created_at.desc(), Transfer.id.desc())
     
     if status:
         query = query.where(Transfer.status == status)
@@ -120,23 +177,38 @@ async def list_transfers(
         query = query.where(Transfer.to_district_id == to_district)
     if has_discrepancy is not None:
         query = query.where(Transfer.has_discrepancy == has_discrepancy)
+    if cursor:
+        cursor_created_at, _, cursor_id = cursor.partition("|")
+        try:
+            cursor_created_at = datetime.fromisoformat(cursor_created_at)
+        except ValueError:
+            raise HTTPException(400, f"Invalid cursor '{cursor}'")
+        if not cursor_id:
+            raise HTTPException(400, f"Invalid cursor '{cursor}'")
+        query = query.where(
+            tuple_(Transfer.created_at, Transfer.id) < tuple_(cursor_created_at, cursor_id)
+        )
     
     query = query.limit(limit)
-    transfers = session.exec(query).all()
+    transfers = [dict(row) for row in session.execute(query).mappings()]
+    next_cursor = None
+    if len(transfers) == limit:
+        last = transfers[-1]
+        next_cursor = f"{last['created_at'].isoformat()}|{last['id']}"
     
-    # Get summary stats
-    total_query = select(Transfer)
-    all_transfers = session.exec(total_query).all()
+    # Get summary stats (aggregated in SQL, not by loading every transfer)
+    status_counts = dict(session.exec(
+        select(Transfer.status, func.count()).group_by(Transfer.status)
+    ).all())
     
-    status_counts = {}
-    for t in all_transfers:
-        status_counts[t.status] = status_counts.get(t.status, 0) + 1
-    
-    discrepancy_count = len([t for t in all_transfers if t.has_discrepancy])
+    discrepancy_count = session.exec(
+        select(func.count()).select_from(Transfer).where(Transfer.has_discrepancy == True)
+    ).one()
     
     return {
-        "transfers": [get_transfer_dict(t) for t in transfers],
+        "transfers": transfers,
         "count": len(transfers),
+        "next_cursor": next_cursor,
         "summary": {
             "by_status": status_counts,
             "with_discrepancies": discrepancy_count
@@ -145,7 +217,7 @@ async def list_transfers(
 
 
 @router.post("/")
-async def create_transfer(
+def create_transfer(
     data: TransferCreate,
     session: Session = Depends(get_session)
 ):
@@ -153,34 +225,37 @@ async def create_transfer(
     Step 1: Sender creates a new transfer.
     Generates transfer ID and sender signature.
     """
-    # Validate districts
-    from_district = session.get(District, data.from_district_id)
-    to_district = session.get(District, data.to_district_id)
+    from_exists, to_exists, medicine_exists = _references_exist(
+        session, data.from_district_id, data.to_district_id, data.medicine_id
+    )
     
-    if not from_district:
+    # Validate districts
+    if not from_exists:
         raise HTTPException(404, f"Source district {data.from_district_id} not found")
-    if not to_district:
+    if not to_exists:
         raise HTTPException(404, f"Destination district {data.to_district_id} not found")
     if data.from_district_id == data.to_district_id:
         raise HTTPException(400, "Source and destination districts must be different")
     
     # Validate medicine
-    medicine = session.get(Medicine, data.medicine_id)
-    if not medicine:
+    if not medicine_exists:
         raise HTTPException(404, f"Medicine {data.medicine_id} not found")
     
-    # Generate transfer ID
+    # Generate transfer ID; one timestamp covers every scan and signature below
     transfer_id = verification_service.generate_transfer_id()
+    now = datetime.now()
     
     # Create transfer items with QR codes
     items_for_signature = []
     transfer_items = []
     
-    for item_data in data.items:
+    for sequence, item_data in enumerate(data.items):
         qr_code = verification_service.generate_batch_qr(
             data.medicine_id,
             item_data.batch_id,
-            item_data.quantity
+            item_data.quantity,
+            now,
+            sequence
         )
         items_for_signature.append({"qr": qr_code, "qty": item_data.quantity})
         
@@ -190,26 +265,28 @@ async def create_transfer(
             batch_id=item_data.batch_id,
             quantity=item_data.quantity,
             scanned_at_sender=True,
-            sender_scan_time=datetime.now()
+            sender_scan_time=now
         )
         transfer_items.append(transfer_item)
     
     # If no items provided, create a single default item
     if not transfer_items:
+        batch_id = f"BATCH-{now.strftime('%Y%m%d%H%M%S')}"
         qr_code = verification_service.generate_batch_qr(
             data.medicine_id,
-            f"BATCH-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            data.quantity
+            batch_id,
+            data.quantity,
+            now
         )
         items_for_signature.append({"qr": qr_code, "qty": data.quantity})
         
         transfer_item = TransferItem(
             transfer_id=transfer_id,
             batch_qr_code=qr_code,
-            batch_id=f"BATCH-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            batch_id=batch_id,
             quantity=data.quantity,
             scanned_at_sender=True,
-            sender_scan_time=datetime.now()
+            sender_scan_time=now
         )
         transfer_items.append(transfer_item)
     
@@ -218,7 +295,7 @@ async def create_transfer(
         party_id=data.created_by,
         transfer_id=transfer_id,
         items=items_for_signature,
-        timestamp=datetime.now()
+        timestamp=now
     )
     
     # Create transfer record
@@ -232,12 +309,13 @@ async def create_transfer(
         created_by=data.created_by,
         sender_signature=sender_signature,
         sender_notes=data.sender_notes,
-        status="created"
+        status="created",
+        created_at=now
     )
     
+    # Items go in as one batch; SQLAlchemy emits a single multi-row INSERT for them
     session.add(transfer)
-    for item in transfer_items:
-        session.add(item)
+    session.add_all(transfer_items)
     session.commit()
     session.refresh(transfer)
     
@@ -250,7 +328,7 @@ async def create_transfer(
 
 
 @router.get("/{transfer_id}")
-async def get_transfer(
+def get_transfer(
     transfer_id: str,
     session: Session = Depends(get_session)
 ):
@@ -259,9 +337,7 @@ async def get_transfer(
     if not transfer:
         raise HTTPException(404, f"Transfer {transfer_id} not found")
     
-    items = session.exec(
-        select(TransferItem).where(TransferItem.transfer_id == transfer_id)
-    ).all()
+    items = get_transfer_items(session, transfer_id)
     
     # Run verification
     transfer_dict = get_transfer_dict(transfer, items)
@@ -282,7 +358,7 @@ async def get_transfer(
 
 
 @router.post("/{transfer_id}/pickup")
-async def record_pickup(
+def record_pickup(
     transfer_id: str,
     data: PickupRequest,
     session: Session = Depends(get_session)
@@ -299,9 +375,7 @@ async def record_pickup(
         raise HTTPException(400, f"Transfer is in '{transfer.status}' status, cannot pickup")
     
     # Get items for signature
-    items = session.exec(
-        select(TransferItem).where(TransferItem.transfer_id == transfer_id)
-    ).all()
+    items = get_transfer_items(session, transfer_id)
     items_for_signature = [{"qr": i.batch_qr_code, "qty": i.quantity} for i in items]
     
     # Create transporter signature
@@ -322,7 +396,7 @@ async def record_pickup(
     transfer.pickup_location_lng = data.pickup_location_lng
     
     # Estimate delivery time (simple calculation)
-    transfer.expected_delivery_at = pickup_time + timedelta(hours=verification_service.MAX_TRANSIT_HOURS)
+    transfer.expected_delivery_at = pickup_time + verification_service.MAX_TRANSIT
     
     session.commit()
     session.refresh(transfer)
@@ -335,7 +409,7 @@ async def record_pickup(
 
 
 @router.post("/{transfer_id}/deliver")
-async def record_delivery(
+def record_delivery(
     transfer_id: str,
     data: DeliveryRequest,
     session: Session = Depends(get_session)
@@ -352,24 +426,35 @@ async def record_delivery(
         raise HTTPException(400, f"Transfer is in '{transfer.status}' status, cannot deliver")
     
     # Get items
-    items = session.exec(
-        select(TransferItem).where(TransferItem.transfer_id == transfer_id)
-    ).all()
+    items = get_transfer_items(session, transfer_id)
     items_for_signature = [{"qr": i.batch_qr_code, "qty": i.quantity} for i in items]
+    delivery_time = datetime.now()
     
-    # Update item scanning status
-    for item in items:
-        item.scanned_at_receiver = True
-        item.receiver_scan_time = datetime.now()
-        
-        # Update condition if provided
-        if data.item_conditions:
-            for cond in data.item_conditions:
-                if cond.get("qr_code") == item.batch_qr_code:
-                    item.condition_on_receipt = cond.get("condition", "good")
+    # Reported conditions keyed by QR code (last report wins)
+    condition_by_qr = {
+        cond.get("qr_code"): cond.get("condition", "good")
+        for cond in data.item_conditions or []
+    }
+    
+    # Mark every item received in one UPDATE; reported conditions are applied
+    # through a CASE on the QR code rather than an UPDATE per item
+    item_values = {"scanned_at_receiver": True, "receiver_scan_time": delivery_time}
+    if condition_by_qr:
+        item_values["condition_on_receipt"] = case(
+            condition_by_qr,
+            value=TransferItem.batch_qr_code,
+            else_=TransferItem.condition_on_receipt
+        )
+    # The loaded items are not synchronized here; they are reloaded in one
+    # query after the commit below
+    session.execute(
+        update(TransferItem)
+        .where(TransferItem.transfer_id == transfer_id)
+        .values(item_values)
+        .execution_options(synchronize_session=False)
+    )
     
     # Create receiver signature
-    delivery_time = datetime.now()
     receiver_signature = verification_service.create_signature(
         party_id=data.receiver_id,
         transfer_id=transfer_id,
@@ -387,9 +472,9 @@ async def record_delivery(
     transfer.delivery_location_lat = data.delivery_location_lat
     transfer.delivery_location_lng = data.delivery_location_lng
     
-    # Run verification
+    # Run verification (every item was just marked as scanned by the receiver)
     transfer_dict = get_transfer_dict(transfer)
-    items_dict = [{"scanned_at_sender": i.scanned_at_sender, "scanned_at_receiver": i.scanned_at_receiver} for i in items]
+    items_dict = [{"scanned_at_sender": i.scanned_at_sender, "scanned_at_receiver": True} for i in items]
     
     verification = verification_service.verify_transfer(transfer_dict, items_dict)
     
@@ -413,6 +498,7 @@ async def record_delivery(
     
     session.commit()
     session.refresh(transfer)
+    items = get_transfer_items(session, transfer_id, refresh=True)
     
     return {
         "message": "Delivery recorded successfully",
@@ -427,7 +513,7 @@ async def record_delivery(
 
 
 @router.get("/{transfer_id}/verify")
-async def verify_transfer(
+def verify_transfer(
     transfer_id: str,
     session: Session = Depends(get_session)
 ):
@@ -436,9 +522,7 @@ async def verify_transfer(
     if not transfer:
         raise HTTPException(404, f"Transfer {transfer_id} not found")
     
-    items = session.exec(
-        select(TransferItem).where(TransferItem.transfer_id == transfer_id)
-    ).all()
+    items = get_transfer_items(session, transfer_id)
     
     transfer_dict = get_transfer_dict(transfer)
     items_dict = [{"scanned_at_sender": i.scanned_at_sender, "scanned_at_receiver": i.scanned_at_receiver} for i in items]
@@ -457,7 +541,7 @@ async def verify_transfer(
 
 
 @router.get("/pending/list")
-async def get_pending_transfers(
+def get_pending_transfers(
     session: Session = Depends(get_session)
 ):
     """Get transfers requiring action (not yet verified)"""
@@ -480,21 +564,20 @@ async def get_pending_transfers(
 
 
 @router.get("/anomalies/list")
-async def get_anomalous_transfers(
+def get_anomalous_transfers(
     session: Session = Depends(get_session)
 ):
     """Get all transfers with discrepancies or anomalies"""
+    # Items are eager-loaded in one extra query instead of one query per transfer
     query = select(Transfer).where(
         Transfer.has_discrepancy == True
-    ).order_by(Transfer.created_at.desc())
+    ).order_by(Transfer.created_at.desc()).options(selectinload(Transfer.items))
     
     transfers = session.exec(query).all()
     
     results = []
     for transfer in transfers:
-        items = session.exec(
-            select(TransferItem).where(TransferItem.transfer_id == transfer.id)
-        ).all()
+        items = transfer.items
         
         transfer_dict = get_transfer_dict(transfer, items)
         items_dict = [{"scanned_at_sender": i.scanned_at_sender, "scanned_at_receiver": i.scanned_at_receiver} for i in items]
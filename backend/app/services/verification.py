@@ -3,13 +3,26 @@ Transfer Verification Service
 Cryptographic chain of custody for anti-corruption medicine transfers
 """
 
+import base64
 import hashlib
-import json
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+import orjson
+
+
+def _encode_digest(h) -> str:
+    """
+    Encode a hash as unpadded URL-safe base64.
+    A SHA256 digest becomes 43 characters instead of 64 hex characters.
+    """
+    return base64.urlsafe_b64encode(h.digest()).rstrip(b"=").decode()
+
 
 @dataclass
 class VerificationResult:
@@ -30,6 +43,19 @@ class TransferVerificationService:
     # Time limits for anomaly detection
     MAX_TRANSIT_HOURS = 48  # Maximum expected transit time
     PICKUP_DEADLINE_HOURS = 24  # Transporter must pickup within 24 hours
+    # Same limits as timedeltas, so elapsed times are compared without
+    # converting to hours (hours are only computed to render a message)
+    MAX_TRANSIT = timedelta(hours=MAX_TRANSIT_HOURS)
+    PICKUP_DEADLINE = timedelta(hours=PICKUP_DEADLINE_HOURS)
+    
+    # Once a transfer reaches a final status its verification inputs never change,
+    # so those results are cached (LRU) instead of being recomputed on every read
+    FINAL_STATUSES = ("verified", "disputed")
+    RESULT_CACHE_SIZE = 1024
+    
+    def __init__(self):
+        self._result_cache: "OrderedDict[Tuple, VerificationResult]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()  # Transfer endpoints run in a threadpool
     
     @staticmethod
     def generate_transfer_id() -> str:
@@ -37,9 +63,18 @@ class TransferVerificationService:
         return f"TXN-{uuid.uuid4().hex[:12].upper()}"
     
     @staticmethod
-    def generate_batch_qr(medicine_id: str, batch_id: str, quantity: int) -> str:
-        """Generate unique QR code for a medicine batch"""
-        data = f"{medicine_id}:{batch_id}:{quantity}:{datetime.now().isoformat()}"
+    def generate_batch_qr(
+        medicine_id: str,
+        batch_id: str,
+        quantity: int,
+        timestamp: datetime,
+        sequence: int = 0
+    ) -> str:
+        """
+        Generate unique QR code for a medicine batch.
+        Batches scanned at the same timestamp are told apart by their sequence.
+        """
+        data = f"{medicine_id}:{batch_id}:{quantity}:{timestamp.isoformat()}:{sequence}"
         return f"QR-{hashlib.sha256(data.encode()).hexdigest()[:16].upper()}"
     
     @staticmethod
@@ -68,13 +103,14 @@ class TransferVerificationService:
             "photo_hash": photo_hash
         }
         
-        payload_str = json.dumps(payload, sort_keys=True)
-        return hashlib.sha256(payload_str.encode()).hexdigest()
+        # Canonical form: sorted keys, compact separators, UTF-8 bytes
+        payload_bytes = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+        return _encode_digest(hashlib.sha256(payload_bytes))
     
     @staticmethod
     def hash_photo(photo_data: bytes) -> str:
         """Create hash of photo evidence"""
-        return hashlib.sha256(photo_data).hexdigest()
+        return _encode_digest(hashlib.sha256(photo_data))
     
     @staticmethod
     def create_verification_hash(
@@ -87,7 +123,7 @@ class TransferVerificationService:
         This proves the complete chain of custody is intact.
         """
         combined = f"{sender_signature}:{transporter_signature}:{receiver_signature}"
-        return hashlib.sha256(combined.encode()).hexdigest()
+        return _encode_digest(hashlib.sha256(combined.encode()))
     
     def verify_transfer(
         self,
@@ -98,6 +134,14 @@ class TransferVerificationService:
         Comprehensive verification of a transfer.
         Checks signatures, timing, quantities, and detects anomalies.
         """
+        cache_key = self._result_cache_key(transfer)
+        if cache_key is not None:
+            with self._result_cache_lock:
+                cached = self._result_cache.get(cache_key)
+                if cached is not None:
+                    self._result_cache.move_to_end(cache_key)
+                    return cached
+        
         anomalies = []
         signatures = {
             "sender": bool(transfer.get("sender_signature")),
@@ -152,13 +196,9 @@ class TransferVerificationService:
         delivered_at = transfer.get("delivered_at")
         
         if created_at and pickup_at:
-            if isinstance(created_at, str):
-                created_at = datetime.fromisoformat(created_at)
-            if isinstance(pickup_at, str):
-                pickup_at = datetime.fromisoformat(pickup_at)
-            
-            pickup_delay = (pickup_at - created_at).total_seconds() / 3600
-            if pickup_delay > self.PICKUP_DEADLINE_HOURS:
+            pickup_delta = pickup_at - created_at
+            if pickup_delta > self.PICKUP_DEADLINE:
+                pickup_delay = pickup_delta.total_seconds() / 3600
                 anomalies.append({
                     "type": "late_pickup",
                     "severity": "warning",
@@ -166,13 +206,9 @@ class TransferVerificationService:
                 })
         
         if pickup_at and delivered_at:
-            if isinstance(pickup_at, str):
-                pickup_at = datetime.fromisoformat(pickup_at)
-            if isinstance(delivered_at, str):
-                delivered_at = datetime.fromisoformat(delivered_at)
-            
-            transit_time = (delivered_at - pickup_at).total_seconds() / 3600
-            if transit_time > self.MAX_TRANSIT_HOURS:
+            transit_delta = delivered_at - pickup_at
+            if transit_delta > self.MAX_TRANSIT:
+                transit_time = transit_delta.total_seconds() / 3600
                 anomalies.append({
                     "type": "extended_transit",
                     "severity": "warning",
@@ -193,13 +229,34 @@ class TransferVerificationService:
             a["severity"] == "critical" for a in anomalies
         )
         
-        return VerificationResult(
+        result = VerificationResult(
             is_valid=is_valid,
             verification_hash=verification_hash,
             anomalies=anomalies,
             chain_complete=chain_complete,
             signatures=signatures
         )
+        
+        if cache_key is not None:
+            with self._result_cache_lock:
+                self._result_cache[cache_key] = result
+                if len(self._result_cache) > self.RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
+        
+        return result
+    
+    def _result_cache_key(self, transfer: Dict) -> Optional[Tuple]:
+        """Cache key for transfers in a final status, None if not cacheable"""
+        if transfer.get("status") not in self.FINAL_STATUSES:
+            return None
+        return (
+            transfer.get("id"),
+            transfer.get("status"),
+            transfer.get("sender_signature"),
+            transfer.get("transporter_signature"),
+            transfer.get("receiver_signature"),
+            transfer.get("received_quantity")
+        )
     
     def detect_pending_anomalies(
         self,
@@ -210,45 +267,45 @@ class TransferVerificationService:
         Called periodically to catch stalled or suspicious transfers.
         """
         alerts = []
-        now = datetime.now()
+        if not transfers:
+            return alerts
         
-        for transfer in transfers:
-            transfer_id = transfer.get("id")
-            status = transfer.get("status")
-            created_at = transfer.get("created_at")
-            
-            if isinstance(created_at, str):
-                created_at = datetime.fromisoformat(created_at)
-            
-            # Check for stalled transfers
-            if status == "created":
-                age_hours = (now - created_at).total_seconds() / 3600
-                if age_hours > self.PICKUP_DEADLINE_HOURS:
-                    alerts.append({
-                        "transfer_id": transfer_id,
-                        "type": "stalled_transfer",
-                        "severity": "warning",
-                        "message": f"Transfer awaiting pickup for {age_hours:.1f} hours",
-                        "from_district": transfer.get("from_district_id"),
-                        "to_district": transfer.get("to_district_id")
-                    })
-            
-            elif status == "picked_up":
-                pickup_at = transfer.get("pickup_at")
-                if isinstance(pickup_at, str):
-                    pickup_at = datetime.fromisoformat(pickup_at)
-                
-                if pickup_at:
-                    transit_hours = (now - pickup_at).total_seconds() / 3600
-                    if transit_hours > self.MAX_TRANSIT_HOURS:
-                        alerts.append({
-                            "transfer_id": transfer_id,
-                            "type": "overdue_delivery",
-                            "severity": "critical",
-                            "message": f"In transit for {transit_hours:.1f} hours - possible diversion",
-                            "from_district": transfer.get("from_district_id"),
-                            "to_district": transfer.get("to_district_id")
-                        })
+        now = np.datetime64(datetime.now(), "us")
+        statuses = np.array([t.get("status") for t in transfers], dtype=object)
+        created_at = np.array([t.get("created_at") for t in transfers], dtype="datetime64[us]")
+        pickup_at = np.array([t.get("pickup_at") for t in transfers], dtype="datetime64[us]")
+        
+        # Stalled transfers are timed from creation, in-transit ones from pickup;
+        # a missing pickup time is NaT, which never exceeds a threshold.
+        awaiting_pickup = statuses == "created"
+        in_transit = statuses == "picked_up"
+        started_at = np.where(awaiting_pickup, created_at, pickup_at)
+        elapsed = now - started_at
+        
+        stalled = awaiting_pickup & (elapsed > np.timedelta64(self.PICKUP_DEADLINE))
+        overdue = in_transit & (elapsed > np.timedelta64(self.MAX_TRANSIT))
+        
+        for i in np.flatnonzero(stalled | overdue):
+            transfer = transfers[i]
+            hours = elapsed[i] / np.timedelta64(1, "h")
+            if stalled[i]:
+                alert = {
+                    "type": "stalled_transfer",
+                    "severity": "warning",
+                    "message": f"Transfer awaiting pickup for {hours:.1f} hours",
+                }
+            else:
+                alert = {
+                    "type": "overdue_delivery",
+                    "severity": "critical",
+                    "message": f"In transit for {hours:.1f} hours - possible diversion",
+                }
+            alerts.append({
+                "transfer_id": transfer.get("id"),
+                **alert,
+                "from_district": transfer.get("from_district_id"),
+                "to_district": transfer.get("to_district_id")
+            })
         
         return alerts
 
@@ -11,15 +11,25 @@ DUAL STRATEGY:
 2. Fallback: Open-Meteo (free) - Perfect for hackathon demos
 """
 
+import asyncio
 import os
 import httpx
-import json
+import logging
+import numpy as np
+import orjson
+import sqlite3
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Load env from parent directory if needed
 env_path = Path(__file__).parent.parent.parent / '.env'
 load_dotenv(env_path)
@@ -32,10 +42,56 @@ GOOGLE_WEATHER_API_KEY = os.getenv("GOOGLE_WEATHER_API_KEY")  # Future: Google M
 OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
 OPEN_METEO_BASE_URL = "https://api.open-meteo.com/v1/forecast"
 
+# HTTP Config
+# HTTP/2 multiplexes concurrent district requests over one connection per host,
+# and idle connections are kept long enough to be reused between refreshes
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128, keepalive_expiry=300.0)
+HTTP_RETRIES = 2  # Retries on connection failures only, never on HTTP errors
+
 # Cache Config
-CACHE_FILE = Path(__file__).parent.parent.parent / "data" / "weather_cache.json"
+# Key-value store: refreshing one entry is a single upsert, not a rewrite of every entry
+CACHE_FILE = Path(__file__).parent.parent.parent / "data" / "weather_cache.db"
 CACHE_TTL = 3600  # 1 hour for current weather
 FORECAST_CACHE_TTL = 21600  # 6 hours for forecasts (they don't change as often)
+MEMORY_CACHE_SIZE = 512  # Entries kept in the in-memory LRU tier
+CACHE_COMPRESSION_LEVEL = 1  # zlib: repeated field names compress well even at the fastest level
+
+# Fallback Config
+# Seasonal averages for Rajasthan by month: (rainfall mm, probability)
+_MONSOON = (15.0, 0.7)  # Jul-Sep
+_SHOULDER = (5.0, 0.5)  # Pre/Post monsoon: Jun, Oct
+_DRY = (0.0, 0.8)
+FALLBACK_SEASON = (
+    _DRY, _DRY, _DRY, _DRY, _DRY, _SHOULDER,
+    _MONSOON, _MONSOON, _MONSOON, _SHOULDER, _DRY, _DRY
+)
+
+
+def _daily_series(values: List, n: int, default: float) -> np.ndarray:
+    """Daily API values as a float array of length n, padded with default if the API sent fewer"""
+    series = np.full(n, default)
+    m = min(n, len(values))
+    series[:m] = values[:m]
+    return series
+
+
+@lru_cache(maxsize=32)
+def _build_fallback_forecast(today: date, days: int) -> List[Dict]:
+    """Seasonal fallback forecast, built once per (day, horizon) while APIs are down"""
+    forecast = []
+    for i in range(days):
+        forecast_date = today + timedelta(days=i+1)
+        rainfall, probability = FALLBACK_SEASON[forecast_date.month - 1]
+        forecast.append({
+            "date": forecast_date.isoformat(),
+            "rainfall_prediction": rainfall,
+            "rainfall_probability": probability,
+            "temperature": 30.0,
+            "humidity": 50.0,
+            "source": "fallback",
+            "is_forecast": True
+        })
+    return forecast
 
 
 class WeatherService:
@@ -50,8 +106,14 @@ class WeatherService:
     """
     
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=15.0)
-        self.cache = self._load_cache()
+        self.client = httpx.AsyncClient(
+            timeout=15.0,
+            transport=httpx.AsyncHTTPTransport(http2=True, limits=HTTP_LIMITS, retries=HTTP_RETRIES)
+        )
+        self.db = self._open_cache()
+        self.db_lock = threading.Lock()  # Writes run in worker threads
+        self.cache = OrderedDict()  # In-memory LRU tier, filled from the database on first use of a key
+        self._inflight = {}  # cache_key -> task currently fetching it, shared by concurrent callers
         
         if not OPENWEATHER_API_KEY:
             print("WARNING: No OpenWeatherMap API Key found!")
@@ -60,19 +122,88 @@ class WeatherService:
         else:
             print("INFO: Using Open-Meteo for weather forecasts (free tier)")
 
-    def _load_cache(self) -> Dict:
-        if CACHE_FILE.exists():
-            try:
-                with open(CACHE_FILE) as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-
-    def _save_cache(self):
+    def _open_cache(self) -> sqlite3.Connection:
         CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(self.cache, f)
+        db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS weather_cache ("
+            "cache_key TEXT PRIMARY KEY, timestamp REAL NOT NULL, data BLOB NOT NULL)"
+        )
+        db.commit()
+        return db
+
+    async def _get_cache_entry(self, cache_key: Tuple) -> Optional[Dict]:
+        """
+        Return the {timestamp, data} entry for a key, reading through to the database.
+        In memory, timestamps are time.monotonic() values; only the database stores wall-clock time.
+        """
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            self.cache.move_to_end(cache_key)
+            return entry
+        
+        # Database reads run in a worker thread, like writes, so waiting on
+        # db_lock behind a write never blocks the event loop
+        entry = await asyncio.to_thread(self._load_cache, cache_key)
+        if entry is not None:
+            # A fetch may have filled the key while the read was in flight; keep the newer entry
+            entry = self.cache.get(cache_key, entry)
+            self._remember(cache_key, entry)
+        return entry
+
+    def _remember(self, cache_key: Tuple, entry: Dict):
+        """Put an entry in the in-memory tier, evicting the least recently used one"""
+        self.cache[cache_key] = entry
+        self.cache.move_to_end(cache_key)
+        if len(self.cache) > MEMORY_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    @staticmethod
+    def _encode_key(cache_key: Tuple) -> str:
+        """Database key for an in-memory tuple key, e.g. ("forecast", "D1", 14) -> forecast_D1_14"""
+        return "_".join(str(part) for part in cache_key)
+
+    def _load_cache(self, cache_key: Tuple) -> Optional[Dict]:
+        """Read one entry from the database; blocking, so callers run it via asyncio.to_thread"""
+        try:
+            with self.db_lock:
+                row = self.db.execute(
+                    "SELECT timestamp, data FROM weather_cache WHERE cache_key = ?",
+                    (self._encode_key(cache_key),)
+                ).fetchone()
+            if row:
+                age = time.time() - row[0]
+                return {"timestamp": time.monotonic() - age, "data": orjson.loads(zlib.decompress(row[1]))}
+        except (sqlite3.Error, zlib.error, orjson.JSONDecodeError) as e:
+            # Unreadable entries (e.g. written before compression) are treated as misses
+            logger.warning("Ignoring weather cache entry %s: %s", self._encode_key(cache_key), e)
+        return None
+
+    def _save_cache(self, cache_key: Tuple, entry: Dict):
+        """Persist one entry; blocking, so callers run it via asyncio.to_thread"""
+        saved_at = time.time() - (time.monotonic() - entry["timestamp"])
+        data = zlib.compress(orjson.dumps(entry["data"]), CACHE_COMPRESSION_LEVEL)
+        with self.db_lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO weather_cache (cache_key, timestamp, data) VALUES (?, ?, ?)",
+                (self._encode_key(cache_key), saved_at, data)
+            )
+
+    async def _single_flight(self, cache_key: Tuple, fetch):
+        """
+        Run fetch() for a key at most once at a time.
+        Concurrent cache misses for the same key await the one in-flight request
+        instead of each calling the API.
+        """
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        # Shielded so a cancelled caller does not cancel the fetch for the others
+        return await asyncio.shield(task)
 
     # =========================================================================
     # CURRENT WEATHER (Existing functionality - OpenWeatherMap)
@@ -82,18 +213,25 @@ class WeatherService:
         """
         Get current weather for a location (Real Data from OpenWeatherMap)
         """
-        cache_key = f"current_{district_id}"
-        now = time.time()
+        # Without a key nothing is fetched or cached, so skip the cache read-through
+        if not OPENWEATHER_API_KEY:
+            return self._get_fallback_weather()
+        
+        cache_key = ("current", district_id)
+        now = time.monotonic()
         
         # Check cache
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
+        entry = await self._get_cache_entry(cache_key)
+        if entry is not None:
             if now - entry['timestamp'] < CACHE_TTL:
                 return entry['data']
         
-        if not OPENWEATHER_API_KEY:
-            return self._get_fallback_weather()
+        return await self._single_flight(
+            cache_key, lambda: self._fetch_current_weather(lat, lon, district_id, cache_key)
+        )
 
+    async def _fetch_current_weather(self, lat: float, lon: float, district_id: str, cache_key: Tuple) -> Dict:
+        """Fetch current weather from OpenWeatherMap and cache it"""
         try:
             url = f"{OPENWEATHER_BASE_URL}/weather"
             params = {
@@ -105,7 +243,7 @@ class WeatherService:
             
             response = await self.client.get(url, params=params)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             weather_data = {
                 "temperature": data['main']['temp'],
@@ -115,11 +253,12 @@ class WeatherService:
             }
             
             # Update cache
-            self.cache[cache_key] = {
-                "timestamp": now,
+            entry = {
+                "timestamp": time.monotonic(),
                 "data": weather_data
             }
-            self._save_cache()
+            self._remember(cache_key, entry)
+            await asyncio.to_thread(self._save_cache, cache_key, entry)
             
             return weather_data
             
@@ -148,15 +287,21 @@ class WeatherService:
             List of dicts with: {date, rainfall_prediction, rainfall_probability, 
                                  temperature, humidity, source}
         """
-        cache_key = f"forecast_{district_id}_{days}"
-        now = time.time()
+        cache_key = ("forecast", district_id, days)
+        now = time.monotonic()
         
         # Check cache (longer TTL for forecasts)
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
+        entry = await self._get_cache_entry(cache_key)
+        if entry is not None:
             if now - entry['timestamp'] < FORECAST_CACHE_TTL:
                 return entry['data']
         
+        return await self._single_flight(
+            cache_key, lambda: self._fetch_forecast(lat, lon, days, cache_key)
+        )
+    
+    async def _fetch_forecast(self, lat: float, lon: float, days: int, cache_key: Tuple) -> List[Dict]:
+        """Fetch a forecast from the configured provider and cache it"""
         # DUAL STRATEGY: Choose API based on available keys
         if GOOGLE_WEATHER_API_KEY:
             forecast = await self._fetch_google_forecast(lat, lon, days)
@@ -165,11 +310,12 @@ class WeatherService:
         
         # Cache the result
         if forecast:
-            self.cache[cache_key] = {
-                "timestamp": now,
+            entry = {
+                "timestamp": time.monotonic(),
                 "data": forecast
             }
-            self._save_cache()
+            self._remember(cache_key, entry)
+            await asyncio.to_thread(self._save_cache, cache_key, entry)
         
         return forecast
     
@@ -181,7 +327,12 @@ class WeatherService:
         - Endpoint: https://weather.googleapis.com/v1/forecast/days:lookup
         - Provides up to 10 days of daily forecasts
         - AI-powered hyperlocal weather predictions
+        
+        The Open-Meteo fallback is requested speculatively alongside Google, so a
+        Google failure adds no extra round-trip; it is cancelled if Google succeeds.
         """
+        fallback = asyncio.create_task(self._fetch_open_meteo_forecast(lat, lon, days))
+        
         try:
             # Google Weather API endpoint
             url = "https://weather.googleapis.com/v1/forecast/days:lookup"
@@ -196,7 +347,7 @@ class WeatherService:
             
             response = await self.client.get(url, params=params)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             forecast = []
             forecast_days = data.get('forecastDays', [])
@@ -240,16 +391,20 @@ class WeatherService:
                 return forecast
             else:
                 print("⚠️ Google Weather API returned empty forecast, falling back to Open-Meteo")
-                return await self._fetch_open_meteo_forecast(lat, lon, days)
+                return await fallback
                 
         except httpx.HTTPStatusError as e:
             print(f"❌ Google Weather API HTTP Error {e.response.status_code}: {e.response.text[:200]}")
             print("Falling back to Open-Meteo...")
-            return await self._fetch_open_meteo_forecast(lat, lon, days)
+            return await fallback
         except Exception as e:
             print(f"❌ Google Weather API Error: {e}")
             print("Falling back to Open-Meteo...")
-            return await self._fetch_open_meteo_forecast(lat, lon, days)
+            return await fallback
+        finally:
+            # No-op once awaited; otherwise its result is not needed, or this
+            # coroutine was cancelled or raised before awaiting it
+            fallback.cancel()
     
     async def _fetch_open_meteo_forecast(self, lat: float, lon: float, days: int) -> List[Dict]:
         """
@@ -276,7 +431,7 @@ class WeatherService:
             
             response = await self.client.get(OPEN_METEO_BASE_URL, params=params)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             daily = data.get('daily', {})
             dates = daily.get('time', [])
@@ -286,35 +441,37 @@ class WeatherService:
             humidity_max = daily.get('relative_humidity_2m_max', [])
             humidity_min = daily.get('relative_humidity_2m_min', [])
             
-            forecast = []
-            for i, date in enumerate(dates):
-                # Calculate averages
-                temp = (temp_max[i] + temp_min[i]) / 2 if i < len(temp_max) else 25.0
-                humidity = (humidity_max[i] + humidity_min[i]) / 2 if i < len(humidity_max) else 50.0
-                rainfall = precip[i] if i < len(precip) else 0.0
-                
-                # Simulate probability (Open-Meteo is deterministic)
-                # Higher rainfall = higher confidence in the prediction
-                if rainfall > 20:
-                    probability = 0.9  # High confidence heavy rain
-                elif rainfall > 5:
-                    probability = 0.8  # Good confidence moderate rain
-                elif rainfall > 0:
-                    probability = 0.7  # Moderate confidence light rain
-                else:
-                    probability = 0.8  # Default confidence for dry weather
-                
-                forecast.append({
-                    "date": date,
-                    "rainfall_prediction": rainfall,
-                    "rainfall_probability": probability,
+            # Calculate averages for all days at once
+            n = len(dates)
+            temperature = (_daily_series(temp_max, n, 25.0) + _daily_series(temp_min, n, 25.0)) / 2
+            humidity = (_daily_series(humidity_max, n, 50.0) + _daily_series(humidity_min, n, 50.0)) / 2
+            rainfall = _daily_series(precip, n, 0.0)
+            if np.isnan(temperature).any() or np.isnan(humidity).any() or np.isnan(rainfall).any():
+                raise ValueError("Open-Meteo returned null daily values")
+            
+            # Simulate probability (Open-Meteo is deterministic)
+            # Higher rainfall = higher confidence in the prediction
+            probability = np.select(
+                [rainfall > 20, rainfall > 5, rainfall > 0],  # Heavy, moderate, light rain
+                [0.9, 0.8, 0.7],
+                default=0.8  # Default confidence for dry weather
+            )
+            
+            return [
+                {
+                    "date": day,
+                    "rainfall_prediction": rain,
+                    "rainfall_probability": prob,
                     "temperature": round(temp, 1),
-                    "humidity": round(humidity, 1),
+                    "humidity": round(hum, 1),
                     "source": "open-meteo",
                     "is_forecast": True
-                })
-            
-            return forecast
+                }
+                for day, rain, prob, temp, hum in zip(
+                    dates, rainfall.tolist(), probability.tolist(),
+                    temperature.tolist(), humidity.tolist()
+                )
+            ]
             
         except Exception as e:
             print(f"Error fetching Open-Meteo forecast: {e}")
@@ -325,35 +482,7 @@ class WeatherService:
         Fallback forecast if all APIs fail
         Uses seasonal averages for Rajasthan
         """
-        forecast = []
-        today = datetime.now().date()
-        
-        for i in range(days):
-            forecast_date = today + timedelta(days=i+1)
-            
-            # Seasonal simulation for Rajasthan
-            month = forecast_date.month
-            if month in [7, 8, 9]:  # Monsoon
-                rainfall = 15.0
-                probability = 0.7
-            elif month in [6, 10]:  # Pre/Post monsoon
-                rainfall = 5.0
-                probability = 0.5
-            else:  # Dry season
-                rainfall = 0.0
-                probability = 0.8
-            
-            forecast.append({
-                "date": forecast_date.strftime("%Y-%m-%d"),
-                "rainfall_prediction": rainfall,
-                "rainfall_probability": probability,
-                "temperature": 30.0,
-                "humidity": 50.0,
-                "source": "fallback",
-                "is_forecast": True
-            })
-        
-        return forecast
+        return _build_fallback_forecast(datetime.now().date(), days)
 
     def _get_fallback_weather(self) -> Dict:
         """Fallback for current weather if API fails"""
@@ -365,7 +494,16 @@ class WeatherService:
         }
 
     async def close(self):
+        # Fetches are shielded from their callers' cancellation, so stop any
+        # still in flight before their client goes away
+        inflight = list(self._inflight.values())
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+        
         await self.client.aclose()
+        with self.db_lock:
+            self.db.close()
 
 
 # Global instance
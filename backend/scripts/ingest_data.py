@@ -1,9 +1,10 @@
 
 import sys
 from pathlib import Path
-import json
+import orjson
 import pandas as pd
 from sqlmodel import Session, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 
 # Add parent directory to path to import app modules
@@ -13,6 +14,23 @@ from app.db.database import engine, create_db_and_tables
 from app.db.models import District, Medicine, Stock, WeatherLog, DiseaseCase
 
 DATA_DIR = Path(__file__).parent.parent / "data"
+DISEASES = ['dengue', 'malaria', 'diarrhea']
+
+# Only the columns that are ingested are tokenized and converted by read_csv
+STOCK_COLUMNS = ['district_id', 'medicine_id', 'current_stock', 'days_until_expiry']
+CASE_COLUMNS = {'date', 'district_id'} | {f"{disease}_cases" for disease in DISEASES}
+WEATHER_COLUMNS = ['date', 'district_id', 'temperature', 'rainfall', 'humidity']
+
+def upsert(session: Session, model, rows: list):
+    """Insert rows, updating existing ids in place, as a single INSERT ... ON CONFLICT"""
+    # Config entries may carry keys that are not table columns (e.g. medicine diseases)
+    columns = model.__table__.columns.keys()
+    stmt = sqlite_insert(model).values([{column: row[column] for column in columns} for row in rows])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={column.name: column for column in stmt.excluded if column.name != 'id'}
+    )
+    session.execute(stmt)
 
 def ingest_data():
     print("Creating tables...")
@@ -21,34 +39,11 @@ def ingest_data():
     with Session(engine) as session:
         # 1. Ingest Config (Districts & Medicines)
         print("Ingesting config.json...")
-        with open(DATA_DIR / "config.json") as f:
-            config = json.load(f)
-            
-        # Districts
-        for d in config['districts']:
-            district = District(
-                id=d['id'],
-                name=d['name'],
-                population=d['population'],
-                type=d['type'],
-                lat=d['lat'],
-                lng=d['lng']
-            )
-            session.merge(district)
-            
-        # Medicines
-        for m in config['medicines']:
-            medicine = Medicine(
-                id=m['id'],
-                name=m['name'],
-                category=m['category'],
-                unit=m['unit'],
-                shelf_life_days=m['shelf_life_days'],
-                cold_chain=m['cold_chain'],
-                prescription_rate=m['prescription_rate'],
-                units_per_case=m['units_per_case']
-            )
-            session.merge(medicine)
+        config = orjson.loads((DATA_DIR / "config.json").read_bytes())
+        
+        # Districts & Medicines
+        upsert(session, District, config['districts'])
+        upsert(session, Medicine, config['medicines'])
         
         session.commit()
         
@@ -57,57 +52,56 @@ def ingest_data():
         
         # Stock
         if (DATA_DIR / "synthetic_stock.csv").exists():
-            df = pd.read_csv(DATA_DIR / "synthetic_stock.csv")
-            for _, row in df.iterrows():
-                # Calculate expiry date from days_until_expiry
-                expiry = datetime.now().date() + pd.Timedelta(days=row['days_until_expiry'])
-                
-                stock = Stock(
-                    district_id=row['district_id'],
-                    medicine_id=row['medicine_id'],
-                    quantity=row['current_stock'],
-                    batch_id=f"BATCH-{row['district_id']}-{datetime.now().year}",
-                    expiry_date=expiry
-                )
-                session.add(stock)
+            df = pd.read_csv(DATA_DIR / "synthetic_stock.csv", usecols=STOCK_COLUMNS)
+            # Calculate expiry date from days_until_expiry
+            today = pd.Timestamp.now().normalize()
+            df['expiry_date'] = (today + pd.to_timedelta(df['days_until_expiry'], unit='D')).dt.date
+            df['batch_id'] = "BATCH-" + df['district_id'] + f"-{datetime.now().year}"
+            df = df.rename(columns={'current_stock': 'quantity'})
+            
+            # One executemany INSERT instead of an ORM object per row
+            session.bulk_insert_mappings(Stock, df[
+                ['district_id', 'medicine_id', 'quantity', 'batch_id', 'expiry_date']
+            ].to_dict('records'))
         
         # Cases
         if (DATA_DIR / "synthetic_cases.csv").exists():
-            df = pd.read_csv(DATA_DIR / "synthetic_cases.csv")
-            for _, row in df.iterrows():
-                 # Handle melted wide format if needed OR assuming long format?
-                 # Looking at synthetic.py, it likely saves in long format or we need to check.
-                 # Let's check the CSV format first in the next step if this fails, but usually standard is long.
-                 # Actually, synthetic.py usually saves generated data. Let's assume standard columns.
-                 # Wait, synthetic.py usually generates `date, district_id, dengue_cases, ...`
-                 
-                 date_val = datetime.strptime(row['date'], '%Y-%m-%d').date()
-                 district_id = row['district_id']
-                 
-                 for disease in ['dengue', 'malaria', 'diarrhea']:
-                     col = f"{disease}_cases"
-                     if col in df.columns:
-                         case = DiseaseCase(
-                             district_id=district_id,
-                             date=date_val,
-                             disease=disease,
-                             count=row[col]
-                         )
-                         session.add(case)
+            df = pd.read_csv(
+                DATA_DIR / "synthetic_cases.csv",
+                usecols=lambda column: column in CASE_COLUMNS,
+                parse_dates=['date'],
+                date_format='%Y-%m-%d'
+            )
+            df['date'] = df['date'].dt.date
+            
+            # Wide format (one <disease>_cases column per disease) -> one row per disease
+            disease_columns = {
+                f"{disease}_cases": disease
+                for disease in DISEASES
+                if f"{disease}_cases" in df.columns
+            }
+            cases = df.melt(
+                id_vars=['date', 'district_id'],
+                value_vars=list(disease_columns),
+                var_name='disease',
+                value_name='count'
+            )
+            cases['disease'] = cases['disease'].map(disease_columns)
+            session.bulk_insert_mappings(DiseaseCase, cases.to_dict('records'))
 
         # Weather
         if (DATA_DIR / "synthetic_weather.csv").exists():
-            df = pd.read_csv(DATA_DIR / "synthetic_weather.csv")
-            for _, row in df.iterrows():
-                log = WeatherLog(
-                    district_id=row['district_id'],
-                    date=datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                    temperature=row['temperature'],
-                    rainfall=row['rainfall'],
-                    humidity=row['humidity'],
-                    source='synthetic'
-                )
-                session.add(log)
+            df = pd.read_csv(
+                DATA_DIR / "synthetic_weather.csv",
+                usecols=WEATHER_COLUMNS,
+                parse_dates=['date'],
+                date_format='%Y-%m-%d'
+            )
+            df['date'] = df['date'].dt.date
+            df['source'] = 'synthetic'
+            session.bulk_insert_mappings(WeatherLog, df[
+                ['district_id', 'date', 'temperature', 'rainfall', 'humidity', 'source']
+            ].to_dict('records'))
         
         session.commit()
         print("Data ingestion complete!")
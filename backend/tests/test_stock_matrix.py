@@ -0,0 +1,58 @@
+"""
+Stock matrix tests
+Run from backend/: python -m unittest discover tests
+"""
+
+import asyncio
+import unittest
+
+import pandas as pd
+
+from app.models.forecaster import CausalDemandForecaster
+
+
+class StockMatrixTest(unittest.TestCase):
+    def make_forecaster(self, stock_rows):
+        # Only the state the stock matrix reads; demand and safety stock are fixed
+        forecaster = CausalDemandForecaster.__new__(CausalDemandForecaster)
+        forecaster.district_ids = ["D1", "D2"]
+        forecaster.medicine_ids = ["M1", "M2"]
+        forecaster._medicine_index = {"M1": 0, "M2": 1}
+        forecaster._stock_matrix = None
+        forecaster._stock_matrix_at = 0.0
+        forecaster._stock_matrix_lock = asyncio.Lock()
+        forecaster.stock_df = pd.DataFrame(stock_rows, columns=["district_id", "medicine_id", "quantity"])
+        
+        async def forecast_medicine_demand(district_id, medicine_id, days_ahead=14):
+            return [{"predicted_demand": 10, "uncertainty": 2} for _ in range(days_ahead)]  # 140 in 14 days
+        
+        async def calculate_safety_stock(district_id, medicine_id, *args, **kwargs):
+            return 60  # Order point: 140 + 60 = 200
+        
+        forecaster.forecast_medicine_demand = forecast_medicine_demand
+        forecaster.calculate_safety_stock = calculate_safety_stock
+        return forecaster
+    
+    def test_batches_in_one_cell_share_demand_and_order_point(self):
+        forecaster = self.make_forecaster([
+            ("D1", "M1", 50),
+            ("D1", "M1", 40),  # Second batch of the same district/medicine
+            ("D2", "M2", 300),
+        ])
+        
+        matrix = asyncio.run(forecaster.stock_matrix())
+        
+        self.assertEqual(matrix.current[0, 0], 90)
+        self.assertEqual(matrix.demand[0, 0], 140)  # Once per cell, not per batch
+        self.assertEqual(matrix.gap[0, 0], 90 - 200)
+        self.assertEqual(matrix.days_until_stockout[0, 0], 9)  # 90 units at 10/day
+        self.assertEqual(matrix.percentage[0, 0], 45)
+        self.assertEqual(matrix.status[0, 0], forecaster.STOCK_WARNING)
+        
+        self.assertEqual(matrix.gap[1, 1], 100)
+        self.assertEqual(matrix.status[1, 1], forecaster.STOCK_GOOD)
+        self.assertEqual(matrix.status[0, 1], forecaster.STOCK_MISSING)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Transfer listing tests
+Run from backend/: python -m unittest discover tests
+"""
+
+import unittest
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.db.database import get_session
+from app.db.models import Transfer
+from app.routers import transfers
+
+
+class ListTransfersPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        SQLModel.metadata.create_all(self.engine)
+        
+        def get_test_session():
+            with Session(self.engine) as session:
+                yield session
+        
+        app = FastAPI()
+        app.include_router(transfers.router, prefix="/api/transfers")
+        app.dependency_overrides[get_session] = get_test_session
+        self.client = TestClient(app)
+    
+    def add_transfers(self, created_at_by_id):
+        with Session(self.engine) as session:
+            for transfer_id, created_at in created_at_by_id.items():
+                session.add(Transfer(
+                    id=transfer_id,
+                    medicine_id="M1",
+                    quantity=10,
+                    from_district_id="D1",
+                    to_district_id="D2",
+                    created_by="officer",
+                    created_at=created_at
+                ))
+            session.commit()
+    
+    def list_pages(self, limit):
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/api/transfers/", params=params)
+            self.assertEqual(response.status_code, 200, response.text)
+            body = response.json()
+            pages.append([t["id"] for t in body["transfers"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                return pages
+    
+    def test_same_created_at_across_page_boundary(self):
+        tied = datetime(2026, 1, 2, 9, 30)
+        self.add_transfers({
+            "TXN-D": datetime(2026, 1, 3),
+            "TXN-C": tied,
+            "TXN-B": tied,
+            "TXN-A": datetime(2026, 1, 1),
+        })
+        
+        # TXN-C ends the first page and TXN-B, created at the same instant, starts the second
+        pages = self.list_pages(limit=2)
+        
+        self.assertEqual(pages, [["TXN-D", "TXN-C"], ["TXN-B", "TXN-A"], []])
+    
+    def test_invalid_cursor(self):
+        for cursor in ("yesterday|TXN-A", "2026-01-02T09:30:00"):
+            response = self.client.get("/api/transfers/", params={"cursor": cursor})
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
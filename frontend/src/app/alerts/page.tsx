@@ -46,7 +46,7 @@ export default function ThreatDetection() {
 
     const loadData = useCallback(async () => {
         try {
-            const data = await getAlerts();
+            const data = await getAlerts(undefined, true);
             setAlerts(data);
             if (data.alerts?.[0]) {
                 setSelectedDistrict(data.alerts[0].district_id);
@@ -34,7 +34,7 @@ interface AlertData {
   district_name: string;
   level: string;
   title: string;
-  message: string;
+  message?: string;
   risk_score: number;
 }
 
@@ -49,10 +49,11 @@ export interface Alert {
     level: 'red' | 'orange' | 'yellow';
     risk_score: number;
     title: string;
-    message: string;
-    signals: Record<string, number>;
-    recommended_actions: string[];
-    triggered_at: string;
+    // Only present when requested with verbose=1
+    message?: string;
+    signals?: Record<string, number>;
+    recommended_actions?: string[];
+    triggered_at?: string;
 }
 
 export interface StockItem {
@@ -98,9 +99,12 @@ export async function getAllMedicineForecast(districtId: string, daysAhead: numb
     return res.json();
 }
 
-export async function getAlerts(level?: string) {
-    const url = level ? `${API_BASE}/api/alerts?level=${level}` : `${API_BASE}/api/alerts`;
-    const res = await fetch(url);
+export async function getAlerts(level?: string, verbose: boolean = false) {
+    const params = new URLSearchParams();
+    if (level) params.append('level', level);
+    if (verbose) params.append('verbose', '1');
+    const query = params.toString();
+    const res = await fetch(query ? `${API_BASE}/api/alerts?${query}` : `${API_BASE}/api/alerts`);
     return res.json();
 }
 
@@ -171,11 +175,12 @@ export interface TransferAnomaly {
     missing_units?: number;
 }
 
-export async function getTransfers(filters?: { status?: string; has_discrepancy?: boolean }) {
+export async function getTransfers(filters?: { status?: string; has_discrepancy?: boolean; cursor?: string }) {
     let url = `${API_BASE}/api/transfers/`;
     const params = new URLSearchParams();
     if (filters?.status) params.append('status', filters.status);
     if (filters?.has_discrepancy !== undefined) params.append('has_discrepancy', String(filters.has_discrepancy));
+    if (filters?.cursor) params.append('cursor', filters.cursor);
     if (params.toString()) url += `?${params.toString()}`;
 
     const res = await fetch(url);